@@ -1,16 +1,28 @@
 import re
 import sys
+import math
 import operator
+import itertools
+import warnings
+from array import array
+from types import BuiltinFunctionType
 import pprint as pretty_print
 
 # Utility functions and data structures
 pprint = lambda obj: pretty_print.PrettyPrinter(indent=4).pprint(obj)
 
-def fail(s):
-    print(s)
-    sys.exit(-1)
+class LispError(Exception):
+    """An error in the program being run.
+
+    Takes a format string and its arguments, and only formats them when the
+    error is displayed.
+    """
+    def __str__(self):
+        return self.args[0].format(*self.args[1:])
 
 class InterpreterObject(object):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -18,60 +30,173 @@ class InterpreterObject(object):
         return str(self.value)
 
 class Symbol(InterpreterObject):
-    pass
+    __slots__ = ()
 
 class String(InterpreterObject):
-    pass
+    __slots__ = ()
+
+# Every occurrence of a name parses to the same Symbol object
+SYMBOL_POOL = {}
+
+def intern_symbol(name):
+    symbol = SYMBOL_POOL.get(name)
+    if symbol is None:
+        symbol = SYMBOL_POOL[name] = Symbol(name)
+    return symbol
+
+# Special forms are resolved once at parse time to these singletons, so the
+# compiler can dispatch on their type instead of comparing strings
+class SpecialForm(Symbol):
+    __slots__ = ()
+
+class LambdaForm(SpecialForm):
+    __slots__ = ()
+
+class IfForm(SpecialForm):
+    __slots__ = ()
+
+class DefineForm(SpecialForm):
+    __slots__ = ()
+
+class BeginForm(SpecialForm):
+    __slots__ = ()
+
+class QuoteForm(SpecialForm):
+    __slots__ = ()
+
+LAMBDA_FORM = LambdaForm('lambda')
+IF_FORM = IfForm('if')
+DEFINE_FORM = DefineForm('define')
+BEGIN_FORM = BeginForm('begin')
+QUOTE_FORM = QuoteForm('quote')
+
+SPECIAL_FORMS = {form.value: form for form in (LAMBDA_FORM, IF_FORM, DEFINE_FORM, BEGIN_FORM, QUOTE_FORM)}
 
 class Lambda(InterpreterObject):
-    def __init__(self, arguments, code):
+    __slots__ = ('arguments', 'code', 'body', 'closure', 'environment',
+                 'pure', 'pure_version', 'memo')
+
+    def __init__(self, arguments, code, body, closure, environment):
         self.arguments = arguments
         self.code = code
+        self.body = body
+        # The frame and global environment the lambda was defined in
+        self.closure = closure
+        self.environment = environment
+        # Whether the lambda was pure and recursive at environment version
+        # pure_version, and its results by argument
+        self.pure = False
+        self.pure_version = -1
+        self.memo = None
 
     def __repr__(self):
         return "(lambda ({}) ({}))".format(self.arguments, self.code)
 
+class Pair(InterpreterObject):
+    """A cons cell. A chain of pairs ending in a Python list is a Lisp list,
+    so cons and cdr share structure instead of copying."""
+    __slots__ = ('head', 'tail', 'length')
+
+    def __init__(self, head, tail):
+        self.head = head
+        self.tail = tail
+        # Lists are never mutated, so the length is counted once
+        self.length = len(tail) + 1
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        node = self
+        while type(node) is Pair:
+            yield node.head
+            node = node.tail
+        yield from node
+
+    def __eq__(self, other):
+        if type(other) is not Pair and type(other) is not list:
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+def pairs(items):
+    # A Python list as a chain of pairs, [] when empty
+    lst = []
+    for item in reversed(items):
+        lst = Pair(item, lst)
+    return lst
+
+def rest(lst):
+    if type(lst) is Pair:
+        return lst.tail
+    if type(lst) is list:
+        # Converted once, so walking a list with cdr stays linear
+        return pairs(lst[1:])
+    return lst[1:] if len(lst) > 1 else []
+
+def append_lists(*lsts):
+    # Copies every list but the last, which becomes the shared tail
+    if not lsts:
+        return []
+    result = lsts[-1]
+    for lst in reversed(lsts[:-1]):
+        for item in reversed(list(lst)):
+            result = Pair(item, result)
+    return result
+
+# Versions are drawn from one counter shared by all environments, so a
+# version number identifies both an environment and the state of its bindings
+ENV_VERSIONS = itertools.count()
+
+class Environment(dict):
+    """Global bindings, with a version that changes whenever one does.
+
+    Lookups and other facts derived from the bindings can be cached against
+    the version. Change bindings with item assignment or deletion; the bulk
+    dict methods (update, pop, ...) don't bump it.
+    """
+    __slots__ = ('version',)
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.version = next(ENV_VERSIONS)
+
+    def __setitem__(self, name, value):
+        dict.__setitem__(self, name, value)
+        self.version = next(ENV_VERSIONS)
+
+    def __delitem__(self, name):
+        dict.__delitem__(self, name)
+        self.version = next(ENV_VERSIONS)
+
 # Parser
-def tokenize(s):
-    ret = []
-    in_string = False
-    current_word = ''
-    
-    for i, char in enumerate(s):
-        if char == "'":
-            if in_string is False:
-                in_string = True
-                current_word += char
-            else:
-                in_string = False
-                current_word += char
-                ret.append(current_word)
-                current_word = ''
+# A quoted string, a parenthesis, or a run of anything else up to whitespace
+TOKEN_RE = re.compile(r"'[^']*'|[()]|[^\s()]+")
 
-        elif in_string is True:
-            current_word += char
+# Token kinds, decided by a token's first character
+PAREN_OPEN = 0
+PAREN_CLOSE = 1
+STRING = 2
+NUMBER = 3
+SYMBOL = 4
 
-        elif char in ['\t', '\n', ' ']:
-            if current_word and not in_string:
-                ret.append(current_word)
-                current_word = ''
+# Characters a numeric literal can start with; NUMBER tokens that fail to
+# convert (such as '-x') are still symbols
+NUMBER_START = frozenset('0123456789+-.')
 
-        elif char in ['(', ')']:
-            if current_word and not in_string:
-                ret.append(current_word)
-                current_word = ''
-            ret.append(char)
+# Tokens starting like a number that are common symbols, kept away from
+# the failing int() and float() conversions
+SIGN_TOKENS = frozenset('+-.')
 
-        else:
-            current_word += char
-            if i < len(s) - 1 and s[i+1] in ['(', ')', ' ', '\n', '\t'] and not in_string:
-                ret.append(current_word)
-                current_word = ''
-    
-    if current_word:
-        ret.append(current_word)
+TOKEN_KINDS = dict.fromkeys(NUMBER_START, NUMBER)
+TOKEN_KINDS.update({'(': PAREN_OPEN, ')': PAREN_CLOSE, "'": STRING})
 
-    return ret
+def tokenize(s):
+    return TOKEN_RE.findall(s)
 
 def is_integer(s):
     try:
@@ -92,110 +217,834 @@ def is_string(s):
         return True
     return False
 
-def parse(tokens):
-    if not tokens:
-        fail("Empty expression")
-    
-    itert = iter(tokens)
-    token = next(itert)
+def parse(source):
+    # Tokens are pulled off the regex while the tree is built, rather than
+    # collected into a list first
+    tokens = TOKEN_RE.finditer(source)
+    match = next(tokens, None)
 
-    if token != '(':
-        fail("Unexpected token {}".format(token))
+    if match is None:
+        raise LispError("Empty expression")
+    if match[0] != '(':
+        raise LispError("Unexpected token {}", match[0])
 
-    return do_parse(itert)
+    return do_parse(tokens)
 
 def do_parse(tokens):
     ret = []
 
-    for token in tokens:
-        if token == '(':
+    for match in tokens:
+        token = match[0]
+        kind = TOKEN_KINDS.get(token[0], SYMBOL)
+        if kind == SYMBOL:
+            if not ret and token in SPECIAL_FORMS:
+                ret.append(SPECIAL_FORMS[token])
+            else:
+                ret.append(intern_symbol(token))
+        elif kind == PAREN_OPEN:
             ret.append(do_parse(tokens))
-        elif token == ')':
+        elif kind == PAREN_CLOSE:
             return ret
-        elif is_integer(token):
-            ret.append(int(token))
-        elif is_float(token):
-            ret.append(float(token))
+        elif kind == NUMBER:
+            if len(token) == 1 and token in SIGN_TOKENS:
+                ret.append(intern_symbol(token))
+                continue
+            try:
+                ret.append(int(token))
+                continue
+            except ValueError:
+                pass
+            try:
+                ret.append(float(token))
+                continue
+            except ValueError:
+                pass
+            ret.append(intern_symbol(token))
         elif is_string(token):
             ret.append(String(token[1:-1]))
         else:
-            ret.append(Symbol(token))
+            # An unterminated quote
+            ret.append(intern_symbol(token))
     
-    fail("Missing closing parenthesis")
+    raise LispError("Missing closing parenthesis")
 
-# Interpreter
-def eval_expr(expr, environment):
-    # Handle atomic values
-    if isinstance(expr, int) or isinstance(expr, float):
-        return expr
-    elif isinstance(expr, str):
+# Bytecode
+LOAD_CONST = 0
+LOAD_GLOBAL = 1
+LOAD_LOCAL = 2
+LOAD_FREE = 3
+CALL = 4
+JUMP_IF_FALSE = 5
+JUMP = 6
+MAKE_LAMBDA = 7
+DEFINE = 8
+STORE_LOCAL = 9
+POP = 10
+RETURN = 11
+TAIL_CALL = 12
+BINARY_OP = 13
+LOAD_DEFINED = 14
+
+# Value of a define-introduced local until its define has run
+UNBOUND = object()
+
+class Code(object):
+    """A flat opcode stream, stored as parallel opcode/argument lists"""
+    def __init__(self):
+        self.opcodes = []
+        self.args = []
+        self.consts = []
+        self.names = []
+        # Inline cache for global lookups, parallel to names: the environment
+        # version each value was read at
+        self.cache_versions = []
+        self.cache_values = []
+        # Parameter names of a lambda body, resolved once at compile time
+        self.params = []
+        # Frame slots needed for locals introduced by define, beyond the parameters
+        self.nlocals = 0
+        # Result kind and operators of numeric lambda bodies, and the arrays
+        # the Numba kernel runs them from
+        self.numeric = None
+        self.native = None
+        # Environment version the numeric operators were last checked at
+        self.native_version = -1
+        # Contiguous int32 copies of opcodes and args, built on demand
+        self.packed_streams = None
+        # Globals a lambda body reads, or None if it can't be pure whatever
+        # they are bound to
+        self.pure_names = None
+        # Builtin operators calls to which may be evaluated while compiling;
+        # only top-level code, run straight after compiling, has any
+        self.foldable = {}
+
+    def emit(self, opcode, arg=0):
+        self.opcodes.append(opcode)
+        self.args.append(arg)
+        return len(self.opcodes) - 1
+
+    def patch(self, index):
+        # Point a previously emitted jump at the next instruction
+        self.args[index] = len(self.opcodes)
+
+    def packed(self):
+        # The instruction stream as two int32 arrays (4 bytes per entry, and
+        # viewable from NumPy without copying). run() keeps indexing the
+        # lists: reading an array boxes a fresh int each time, which made the
+        # loop about 20% slower
+        if self.packed_streams is None:
+            self.packed_streams = (array('i', self.opcodes), array('i', self.args))
+        return self.packed_streams
+
+    def add_const(self, value):
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def add_name(self, name):
+        if name not in self.names:
+            self.names.append(name)
+            self.cache_versions.append(-1)
+            self.cache_values.append(None)
+        return self.names.index(name)
+
+class Scope(object):
+    """Compile-time layout of a lambda's frame.
+
+    A frame is a list whose slot 0 holds the frame the lambda was defined
+    in, followed by the parameters and then any names the body defines.
+    """
+    def __init__(self, params, parent):
+        self.slots = {}
+        self.parent = parent
+        for i, name in enumerate(params):
+            self.slots[name] = i + 1
+        self.size = len(params) + 1
+        # Slots from here on are introduced by define and start out unbound
+        self.first_local = self.size
+
+    def declare(self, name):
+        if name not in self.slots:
+            self.slots[name] = self.size
+            self.size += 1
+
+def resolve(name, scope):
+    # Returns (depth, slot) for a lexically bound name, None for a global
+    depth = 0
+    while scope is not None:
+        if name in scope.slots:
+            return depth, scope.slots[name]
+        scope = scope.parent
+        depth += 1
+    return None
+
+def find_defines(expr, names):
+    # Collect the names a lambda body defines, without entering nested lambdas
+    if not isinstance(expr, list) or not expr:
+        return names
+    if expr[0] is LAMBDA_FORM or expr[0] is QUOTE_FORM:
+        return names
+    if expr[0] is DEFINE_FORM and len(expr) == 3 and isinstance(expr[1], Symbol):
+        names.append(expr[1].value)
+    for ex in expr[1:]:
+        find_defines(ex, names)
+    return names
+
+# Builtins compiled to BINARY_OP when called with two arguments
+BINARY_OPERATORS = frozenset(['+', '-', '*', '/', '>', '>=', '<', '<=', '=', '!='])
+
+# Returned by constant_value for expressions only known at run time
+NOT_CONSTANT = object()
+
+# Compiler
+def compile_expr(expr, scope=None, foldable=None):
+    code = Code()
+    if foldable is not None:
+        code.foldable = foldable
+    compile_into(expr, code, scope)
+    code.emit(RETURN)
+    mark_tail_calls(code)
+    return code
+
+def mark_tail_calls(code):
+    # A call whose result is returned as-is (the last expression of a begin,
+    # either branch of an if, a lambda body) doesn't need its own Python frame
+    for pc, op in enumerate(code.opcodes):
+        if op == CALL and returns_from(code, pc + 1):
+            code.opcodes[pc] = TAIL_CALL
+
+def returns_from(code, pc):
+    while code.opcodes[pc] == JUMP:
+        pc = code.args[pc]
+    return code.opcodes[pc] == RETURN
+
+def compile_into(expr, code, scope):
+    # Node types are leaf classes, so an exact type lookup replaces an
+    # isinstance chain; anything unlisted is already a value
+    COMPILE_DISPATCH.get(type(expr), compile_const)(expr, code, scope)
+
+def compile_const(expr, code, scope):
+    code.emit(LOAD_CONST, code.add_const(expr))
+
+def compile_string(expr, code, scope):
+    code.emit(LOAD_CONST, code.add_const(expr.value))
+
+def compile_symbol(expr, code, scope):
+    name = expr.value
+    ref = resolve(name, scope)
+    if ref is None:
+        code.emit(LOAD_GLOBAL, code.add_name(name))
+    elif ref[0] == 0 and ref[1] < scope.first_local:
+        code.emit(LOAD_LOCAL, ref[1])
+    elif ref[0] == 0:
+        code.emit(LOAD_DEFINED, code.add_const((ref[1], name)))
+    else:
+        code.emit(LOAD_FREE, code.add_const(ref + (name,)))
+
+def compile_list(expr, code, scope):
+    if not expr:
+        code.emit(LOAD_CONST, code.add_const([]))
+        return
+
+    # Handle special forms
+    handler = SPECIAL_DISPATCH.get(type(expr[0]))
+    if handler is not None:
+        handler(expr, code, scope)
+        return
+
+    # Calls to the arithmetic and comparison builtins become a single
+    # instruction, unless the operator's name is lexically rebound
+    value = constant_value(expr, code, scope)
+    if value is not NOT_CONSTANT:
+        code.emit(LOAD_CONST, code.add_const(value))
+        return
+
+    head = expr[0]
+    if (len(expr) == 3 and type(head) is Symbol and head.value in BINARY_OPERATORS
+            and resolve(head.value, scope) is None):
+        compile_into(expr[1], code, scope)
+        compile_into(expr[2], code, scope)
+        code.emit(BINARY_OP, code.add_name(head.value))
+        return
+
+    # Function call
+    for ex in expr:
+        compile_into(ex, code, scope)
+    code.emit(CALL, len(expr) - 1)
+
+def compile_lambda(expr, code, scope):
+    if len(expr) < 3:
+        raise LispError("Lambda requires arguments and body")
+    arg_names = expr[1]
+    body = expr[2]
+
+    if not isinstance(arg_names, list):
+        raise LispError("Lambda arguments must be a list")
+
+    params = [arg.value if isinstance(arg, Symbol) else arg for arg in arg_names]
+    body_scope = Scope(params, scope)
+    for name in find_defines(body, []):
+        body_scope.declare(name)
+
+    # Lambda bodies are not folded: they may run after an operator has been
+    # redefined
+    body_code = compile_expr(body, body_scope)
+    body_code.params = params
+    body_code.nlocals = body_scope.size - len(params) - 1
+    body_code.numeric = numeric_signature(params, body, body_code)
+    body_code.pure_names = global_reads(body_code)
+    code.emit(MAKE_LAMBDA, code.add_const((arg_names, body, body_code)))
+
+def compile_if(expr, code, scope):
+    if len(expr) < 3:
+        raise LispError("If requires at least condition and then clause")
+    condition = constant_value(expr[1], code, scope)
+    if condition is not NOT_CONSTANT:
+        # Only the branch that would be taken is compiled
+        if condition is not False:
+            compile_into(expr[2], code, scope)
+        elif len(expr) == 4:
+            compile_into(expr[3], code, scope)
+        else:
+            code.emit(LOAD_CONST, code.add_const(None))
+        return
+    compile_into(expr[1], code, scope)
+    jump_to_else = code.emit(JUMP_IF_FALSE)
+    compile_into(expr[2], code, scope)
+    jump_to_end = code.emit(JUMP)
+    code.patch(jump_to_else)
+    if len(expr) == 4:
+        compile_into(expr[3], code, scope)
+    else:
+        code.emit(LOAD_CONST, code.add_const(None))
+    code.patch(jump_to_end)
+
+def constant_value(expr, code, scope):
+    # The value of arithmetic and comparisons over number literals, worked
+    # out at compile time, or NOT_CONSTANT
+    if type(expr) is int or type(expr) is float:
         return expr
-    elif isinstance(expr, String):
-        return expr.value
-    elif isinstance(expr, Symbol):
-        if expr.value not in environment:
-            fail("Couldn't find symbol {}".format(expr.value))
-        return environment[expr.value]
-    elif isinstance(expr, list):
-        if not expr:
-            return []
-        
-        # Handle special forms
-        if isinstance(expr[0], Symbol):
-            if expr[0].value == 'lambda':
-                if len(expr) < 3:
-                    fail("Lambda requires arguments and body")
-                arg_names = expr[1]
-                code = expr[2]
-                return Lambda(arg_names, code)
-
-            elif expr[0].value == 'if':
-                if len(expr) < 3:
-                    fail("If requires at least condition and then clause")
-                condition = expr[1]
-                then_clause = expr[2]
-                else_clause = None
-                if len(expr) == 4:
-                    else_clause = expr[3]
-
-                if eval_expr(condition, environment) is not False:
-                    return eval_expr(then_clause, environment)
-                elif else_clause is not None:
-                    return eval_expr(else_clause, environment)
-                else:
-                    return None
-
-            elif expr[0].value == 'define':
-                if len(expr) != 3:
-                    fail("Define requires name and value")
-                name = expr[1].value
-                value = eval_expr(expr[2], environment)
-                environment[name] = value
-                return value
-
-            elif expr[0].value == 'begin':
-                result = None
-                for ex in expr[1:]:
-                    result = eval_expr(ex, environment)
-                return result
-
-            elif expr[0].value == 'quote':
-                if len(expr) != 2:
-                    fail("Quote requires exactly one argument")
-                return expr[1]
+    if type(expr) is not list or len(expr) < 3:
+        return NOT_CONSTANT
+
+    head = expr[0]
+    if head is IF_FORM:
+        if len(expr) != 4:
+            return NOT_CONSTANT
+        condition = constant_value(expr[1], code, scope)
+        if condition is NOT_CONSTANT:
+            return NOT_CONSTANT
+        return constant_value(expr[3] if condition is False else expr[2], code, scope)
+
+    if len(expr) != 3 or type(head) is not Symbol:
+        return NOT_CONSTANT
+    fn = code.foldable.get(head.value)
+    if fn is None or resolve(head.value, scope) is not None:
+        return NOT_CONSTANT
+    left = constant_value(expr[1], code, scope)
+    if left is NOT_CONSTANT:
+        return NOT_CONSTANT
+    right = constant_value(expr[2], code, scope)
+    if right is NOT_CONSTANT:
+        return NOT_CONSTANT
+    try:
+        return fn(left, right)
+    except Exception:
+        # Errors such as division by zero are left to surface at run time
+        return NOT_CONSTANT
+
+def foldable_operators(expr, environment):
+    # The operators still bound to their builtins, leaving out any that expr
+    # itself redefines before its calls would run
+    defined = find_defines(expr, [])
+    return {name: fn for name, fn in JIT_OPERATORS.items()
+            if name not in defined and environment.get(name) is fn}
+
+def compile_define(expr, code, scope):
+    if len(expr) != 3:
+        raise LispError("Define requires name and value")
+    compile_into(expr[2], code, scope)
+    name = expr[1].value
+    if scope is not None and name in scope.slots:
+        code.emit(STORE_LOCAL, scope.slots[name])
+    else:
+        code.emit(DEFINE, code.add_name(name))
+
+def compile_begin(expr, code, scope):
+    if len(expr) == 1:
+        code.emit(LOAD_CONST, code.add_const(None))
+    for i, ex in enumerate(expr[1:]):
+        if i > 0:
+            code.emit(POP)
+        compile_into(ex, code, scope)
+
+def compile_quote(expr, code, scope):
+    if len(expr) != 2:
+        raise LispError("Quote requires exactly one argument")
+    code.emit(LOAD_CONST, code.add_const(expr[1]))
+
+COMPILE_DISPATCH = {
+    int: compile_const,
+    float: compile_const,
+    str: compile_const,
+    String: compile_string,
+    Symbol: compile_symbol,
+    list: compile_list,
+}
+
+SPECIAL_DISPATCH = {
+    LambdaForm: compile_lambda,
+    IfForm: compile_if,
+    DefineForm: compile_define,
+    BeginForm: compile_begin,
+    QuoteForm: compile_quote,
+}
 
+# Numba JIT for numeric lambdas
+# Builtins a numeric lambda may call, in the order run_numeric numbers them
+NUMERIC_OPERATORS = (
+    ('+', operator.add),
+    ('-', operator.sub),
+    ('*', operator.mul),
+    ('/', operator.truediv),
+    ('>', operator.gt),
+    ('>=', operator.ge),
+    ('<', operator.lt),
+    ('<=', operator.le),
+    ('=', operator.eq),
+    ('!=', operator.ne),
+)
+
+JIT_OPERATORS = dict(NUMERIC_OPERATORS)
+OPERATOR_CODES = {name: i for i, (name, _) in enumerate(NUMERIC_OPERATORS)}
+JIT_COMPARISONS = frozenset(['>', '>=', '<', '<=', '=', '!='])
+
+# Everything a numeric body compiles to; anything else (globals, calls,
+# closures, define) rules it out
+NUMERIC_OPCODES = frozenset([LOAD_LOCAL, LOAD_CONST, BINARY_OP, JUMP_IF_FALSE, JUMP, RETURN])
+
+# Constant types the kernel can hold as floats
+NUMERIC_CONSTANTS = frozenset([int, float, bool])
+
+# Returned by call_native when a call has to go through the interpreter
+NOT_NATIVE = object()
+
+# Argument types of run_numeric as call_native passes them, so the kernel
+# can be compiled, and fail to compile, up front
+NUMERIC_SIGNATURE = ('float64(int32[::1], int32[::1], float64[::1], int32[::1], '
+                     'float64[::1], float64[::1])')
+
+numba_module = None
+numpy_module = None
+numeric_kernel = None
+
+def load_numba():
+    # Numba takes a while to import, so only pay for it once a numeric
+    # lambda is actually called
+    global numba_module, numpy_module
+    if numba_module is None:
+        try:
+            import numba
+            import numpy
+        except ImportError:
+            numba = numpy = False
+        numba_module = numba
+        numpy_module = numpy
+    return numba_module
+
+def numeric_signature(params, body, code):
+    # For a body that only uses its parameters, numbers, if and the numeric
+    # builtins, returns (result kind, operator names used)
+    if not params or not set(code.opcodes) <= NUMERIC_OPCODES:
+        return None
+    # Constants go into a float64 array; folding can leave booleans there
+    for const in code.consts:
+        if type(const) not in NUMERIC_CONSTANTS:
+            return None
+    used = set()
+    kind = numeric_kind(body, set(params), used)
+    # The kernel computes in floats, so ints may only feed into float
+    # arithmetic or comparisons, never come out as the result
+    if kind is None or kind == 'int':
+        return None
+    return kind, tuple(sorted(used))
+
+def numeric_kind(expr, params, used):
+    # Returns 'int', 'float' or 'bool', assuming every parameter is a float
+    if type(expr) is int:
+        # Beyond 2**53 an int no longer survives the trip through a float
+        return 'int' if abs(expr) <= 2 ** 53 else None
+    if type(expr) is float:
+        return 'float' if math.isfinite(expr) else None
+    if type(expr) is Symbol:
+        return 'float' if expr.value in params else None
+    if type(expr) is not list or not expr:
+        return None
+
+    if expr[0] is IF_FORM:
+        # Lisp treats everything but False as true, so only accept conditions
+        # that are themselves comparisons
+        if len(expr) != 4:
+            return None
+        kinds = [numeric_kind(ex, params, used) for ex in expr[1:]]
+        if None in kinds or kinds[0] != 'bool' or kinds[1] != kinds[2]:
+            return None
+        return kinds[1]
+
+    head = expr[0]
+    if type(head) is not Symbol or head.value not in JIT_OPERATORS or head.value in params:
+        return None
+    if len(expr) != 3:
+        return None
+    left = numeric_kind(expr[1], params, used)
+    right = numeric_kind(expr[2], params, used)
+    if left is None or right is None or 'bool' in (left, right):
+        return None
+    used.add(head.value)
+    if head.value in JIT_COMPARISONS:
+        return 'bool'
+    if head.value == '/' or 'float' in (left, right):
+        return 'float'
+    # Python ints don't overflow, fixed-width ones do
+    return None
+
+def run_numeric(opcodes, args, consts, operators, params, stack):
+    # The dispatch loop for numeric bodies, over int32 instruction arrays and
+    # a float64 stack; comparisons push 1.0 or 0.0. Compiled with Numba, so
+    # it sticks to the subset of Python Numba understands (no float(bool))
+    sp = 0
+    pc = 0
+    while True:
+        op = opcodes[pc]
+        arg = args[pc]
+        pc += 1
+
+        if op == LOAD_LOCAL:
+            stack[sp] = params[arg - 1]
+            sp += 1
+        elif op == LOAD_CONST:
+            stack[sp] = consts[arg]
+            sp += 1
+        elif op == BINARY_OP:
+            sp -= 1
+            right = stack[sp]
+            left = stack[sp - 1]
+            kind = operators[arg]
+            if kind == 0:
+                result = left + right
+            elif kind == 1:
+                result = left - right
+            elif kind == 2:
+                result = left * right
+            elif kind == 3:
+                result = left / right
+            elif kind == 4:
+                result = 1.0 if left > right else 0.0
+            elif kind == 5:
+                result = 1.0 if left >= right else 0.0
+            elif kind == 6:
+                result = 1.0 if left < right else 0.0
+            elif kind == 7:
+                result = 1.0 if left <= right else 0.0
+            elif kind == 8:
+                result = 1.0 if left == right else 0.0
             else:
-                # Function call
-                fn = eval_expr(expr[0], environment)
-                args = [eval_expr(arg, environment) for arg in expr[1:]]
-                return apply_fn(fn, args, environment)
+                result = 1.0 if left != right else 0.0
+            stack[sp - 1] = result
+        elif op == JUMP_IF_FALSE:
+            sp -= 1
+            if stack[sp] == 0.0:
+                pc = arg
+        elif op == JUMP:
+            pc = arg
         else:
-            # Function call where function is not a symbol
-            fn = eval_expr(expr[0], environment)
-            args = [eval_expr(arg, environment) for arg in expr[1:]]
-            return apply_fn(fn, args, environment)
-    
-    return expr
+            return stack[sp - 1]
+
+def jit_compile(code):
+    # Returns the arrays run_numeric needs for this body, or None without Numba
+    global numeric_kernel
+    numba = load_numba()
+    if not numba:
+        return None
+    numpy = numpy_module
+    if numeric_kernel is None:
+        # One kernel for every numeric body, cached on disk across runs
+        try:
+            numeric_kernel = numba.njit(NUMERIC_SIGNATURE, cache=True)(run_numeric)
+        except Exception as e:
+            warnings.warn("Numba could not compile the numeric kernel, numeric lambdas "
+                          "will run in the interpreter: {}".format(e))
+            numeric_kernel = False
+    if not numeric_kernel:
+        return None
+
+    opcodes, args = code.packed()
+    consts = [float(c) for c in code.consts]
+    operators = [OPERATOR_CODES.get(name, -1) for name in code.names]
+    return (numpy.frombuffer(opcodes, dtype=numpy.intc),
+            numpy.frombuffer(args, dtype=numpy.intc),
+            numpy.array(consts, dtype=numpy.float64),
+            numpy.array(operators, dtype=numpy.intc))
+
+def call_native(fn, args):
+    # Only float arguments are sent to native code: the kernel computes in
+    # floats, and ints would lose Python's unbounded precision
+    if len(args) != len(fn.body.params):
+        return NOT_NATIVE
+    for arg in args:
+        if type(arg) is not float:
+            return NOT_NATIVE
+
+    code = fn.body
+    if code.native is None:
+        code.native = jit_compile(code)
+        if code.native is None:
+            code.numeric = None
+            return NOT_NATIVE
+
+    # The operators may have been redefined since the body was compiled
+    environment = fn.environment
+    if code.native_version != environment.version:
+        for name in code.numeric[1]:
+            if environment.get(name) is not JIT_OPERATORS[name]:
+                return NOT_NATIVE
+        code.native_version = environment.version
+
+    opcodes, code_args, consts, operators = code.native
+    numpy = numpy_module
+    try:
+        result = numeric_kernel(opcodes, code_args, consts, operators,
+                                numpy.array(args, dtype=numpy.float64), numpy.empty(len(opcodes)))
+    except ArithmeticError:
+        # The body is pure, so the interpreter can rerun this call and report
+        # errors such as division by zero the usual way
+        return NOT_NATIVE
+    if code.numeric[0] == 'bool':
+        return bool(result)
+    return float(result)
+
+# Memoization of pure lambdas
+# Opcodes that let a body depend on more than its arguments and globals
+IMPURE_OPCODES = frozenset([DEFINE, LOAD_FREE, MAKE_LAMBDA])
+
+# Argument types that are hashable and immutable, so safe as memo keys
+MEMO_TYPES = frozenset([int, float, bool, str, type(None)])
+
+# A memo table that grows past this is cleared rather than kept forever
+MEMO_LIMIT = 100000
+
+def global_reads(code):
+    if not set(code.opcodes).isdisjoint(IMPURE_OPCODES):
+        return None
+    return tuple(code.names)
+
+def is_pure(fn):
+    environment = fn.environment
+    if fn.pure_version != environment.version:
+        # Any rebinding may change what the body calls, so recheck and
+        # forget results computed under the old bindings. Only recursive
+        # lambdas are memoized: other calls rarely repeat their arguments,
+        # and would just pay for the memo table
+        fn.pure = (check_pure(fn.body, environment, set())
+                   and reaches(fn.body, fn.body, environment, set()))
+        fn.pure_version = environment.version
+        fn.memo = {}
+    return fn.pure
+
+def check_pure(code, environment, seen):
+    # Pure when every global the body reads is immutable data, a pure builtin
+    # or another pure lambda; a body already being checked (recursion)
+    # counts as pure unless something else rules it out. Lists are impure,
+    # since they can hold functions with side effects
+    if code.pure_names is None:
+        return False
+    if code in seen:
+        return True
+    seen.add(code)
+    for name in code.pure_names:
+        value = environment.get(name)
+        if type(value) is Lambda:
+            if value.environment is not environment or not check_pure(value.body, environment, seen):
+                return False
+        elif type(value) not in MEMO_TYPES and value is not PURE_BUILTINS.get(name):
+            return False
+    return True
+
+def reaches(code, target, environment, seen):
+    # Whether code calls into target, directly or through other lambdas
+    for name in code.pure_names:
+        value = environment.get(name)
+        if type(value) is Lambda and value.body not in seen:
+            if value.body is target:
+                return True
+            seen.add(value.body)
+            if reaches(value.body, target, environment, seen):
+                return True
+    return False
+
+def call_memoized(fn, args):
+    # fn is known to be pure, see is_pure
+    for arg in args:
+        if type(arg) not in MEMO_TYPES:
+            return call_lambda(fn, args)
+    # 1, 1.0 and True compare equal, so the key records the types too
+    key = (*args, *map(type, args))
+    memo = fn.memo
+    if key in memo:
+        return memo[key]
+    result = call_lambda(fn, args)
+    if len(memo) >= MEMO_LIMIT:
+        memo.clear()
+    memo[key] = result
+    return result
+
+# Interpreter
+def run(code, environment, frame=None):
+    opcodes = code.opcodes
+    args = code.args
+    consts = code.consts
+    names = code.names
+    cache_versions = code.cache_versions
+    cache_values = code.cache_values
+    stack = []
+    pc = 0
+
+    # Ordered by how often each opcode shows up in typical programs
+    while True:
+        op = opcodes[pc]
+        arg = args[pc]
+        pc += 1
+
+        if op == LOAD_LOCAL:
+            stack.append(frame[arg])
+        elif op == LOAD_GLOBAL:
+            if cache_versions[arg] == environment.version:
+                stack.append(cache_values[arg])
+            else:
+                stack.append(load_global(code, environment, arg))
+        elif op == BINARY_OP:
+            if cache_versions[arg] == environment.version:
+                fn = cache_values[arg]
+            else:
+                fn = load_global(code, environment, arg)
+            right = stack.pop()
+            if type(fn) is BuiltinFunctionType:
+                stack[-1] = fn(stack[-1], right)
+            else:
+                # The operator has been redefined
+                stack[-1] = apply_fn(fn, [stack[-1], right], environment)
+        elif op == LOAD_CONST:
+            stack.append(consts[arg])
+        elif op == CALL:
+            start = len(stack) - arg
+            fn = stack[start - 1]
+            if type(fn) is Lambda:
+                if fn.body.pure_names is not None and is_pure(fn):
+                    result = call_memoized(fn, stack[start:])
+                    del stack[start - 1:]
+                    stack.append(result)
+                    continue
+                if fn.body.numeric is not None:
+                    result = call_native(fn, stack[start:])
+                    if result is not NOT_NATIVE:
+                        del stack[start - 1:]
+                        stack.append(result)
+                        continue
+                # The callee's frame is the function slot plus its arguments
+                new_frame = stack[start - 1:]
+                del stack[start - 1:]
+                stack.append(run(fn.body, fn.environment, enter_frame(fn, new_frame)))
+            # Builtins with one or two arguments, nearly every call in practice,
+            # take their arguments straight off the stack
+            elif arg == 2 and callable(fn):
+                right = stack.pop()
+                left = stack.pop()
+                stack[-1] = fn(left, right)
+            elif arg == 1 and callable(fn):
+                value = stack.pop()
+                stack[-1] = fn(value)
+            else:
+                fn_args = stack[start:]
+                del stack[start - 1:]
+                stack.append(apply_fn(fn, fn_args, environment))
+        elif op == TAIL_CALL:
+            start = len(stack) - arg
+            fn = stack[start - 1]
+            if type(fn) is not Lambda:
+                return apply_fn(fn, stack[start:], environment)
+            if fn.body.numeric is not None:
+                result = call_native(fn, stack[start:])
+                if result is not NOT_NATIVE:
+                    return result
+            # Reuse this loop for the callee instead of recursing into run
+            frame = enter_frame(fn, stack[start - 1:])
+            environment = fn.environment
+            code = fn.body
+            opcodes = code.opcodes
+            args = code.args
+            consts = code.consts
+            names = code.names
+            cache_versions = code.cache_versions
+            cache_values = code.cache_values
+            stack = []
+            pc = 0
+        elif op == JUMP_IF_FALSE:
+            if stack.pop() is False:
+                pc = arg
+        elif op == JUMP:
+            pc = arg
+        elif op == RETURN:
+            return stack.pop()
+        elif op == LOAD_FREE:
+            depth, slot, name = consts[arg]
+            outer = frame
+            for _ in range(depth):
+                outer = outer[0]
+            value = outer[slot]
+            if value is UNBOUND:
+                raise LispError("Couldn't find symbol {}", name)
+            stack.append(value)
+        elif op == LOAD_DEFINED:
+            slot, name = consts[arg]
+            value = frame[slot]
+            if value is UNBOUND:
+                raise LispError("Couldn't find symbol {}", name)
+            stack.append(value)
+        elif op == POP:
+            stack.pop()
+        elif op == STORE_LOCAL:
+            frame[arg] = stack[-1]
+        elif op == DEFINE:
+            environment[names[arg]] = stack[-1]
+        elif op == MAKE_LAMBDA:
+            stack.append(Lambda(*consts[arg], frame, environment))
+        else:
+            raise LispError("Unknown opcode {}", op)
+
+def load_global(code, environment, arg):
+    # Inline cache miss: look the name up and remember it for this version
+    try:
+        value = environment[code.names[arg]]
+    except KeyError:
+        raise LispError("Couldn't find symbol {}", code.names[arg]) from None
+    code.cache_versions[arg] = environment.version
+    code.cache_values[arg] = value
+    return value
+
+def enter_frame(fn, frame):
+    # frame holds the arguments from slot 1 on; slot 0 becomes the link to
+    # the defining frame and define-introduced locals are appended
+    if len(frame) - 1 != len(fn.body.params):
+        raise LispError("Mismatched number of arguments to lambda: expected {}, got {}",
+                        len(fn.body.params), len(frame) - 1)
+    frame[0] = fn.closure
+    if fn.body.nlocals:
+        frame.extend([UNBOUND] * fn.body.nlocals)
+    return frame
+
+def eval_expr(expr, environment):
+    if not isinstance(environment, Environment):
+        raise TypeError("Expected an Environment, got {}".format(type(environment).__name__))
+    return run(compile_expr(expr, None, foldable_operators(expr, environment)), environment)
 
 def apply_fn(fn, args, environment):
     # Built-in function
@@ -204,22 +1053,23 @@ def apply_fn(fn, args, environment):
     
     # User-defined lambda
     if isinstance(fn, Lambda):
-        new_env = dict(environment)
-        if len(args) != len(fn.arguments):
-            fail("Mismatched number of arguments to lambda: expected {}, got {}".format(
-                len(fn.arguments), len(args)))
-        
-        # Bind arguments to parameters
-        for i in range(len(fn.arguments)):
-            param_name = fn.arguments[i].value if isinstance(fn.arguments[i], Symbol) else fn.arguments[i]
-            new_env[param_name] = args[i]
-        
-        return eval_expr(fn.code, new_env)
+        if fn.body.pure_names is not None and is_pure(fn):
+            return call_memoized(fn, args)
+        return call_lambda(fn, args)
     
-    fail("Cannot apply non-function: {}".format(fn))
+    raise LispError("Cannot apply non-function: {}", fn)
+
+def call_lambda(fn, args):
+    if fn.body.numeric is not None:
+        result = call_native(fn, args)
+        if result is not NOT_NATIVE:
+            return result
+    frame = [None]
+    frame.extend(args)
+    return run(fn.body, fn.environment, enter_frame(fn, frame))
 
 # Base environment with built-in functions
-base_environment = {
+base_environment = Environment({
     '+': operator.add,
     '-': operator.sub,
     '*': operator.mul,
@@ -234,16 +1084,22 @@ base_environment = {
     'null?': lambda x: x is None,
     'print': lambda x: print(x),
     'list': lambda *args: list(args),
-    'car': lambda lst: lst[0] if lst else None,
-    'cdr': lambda lst: lst[1:] if len(lst) > 1 else [],
-    'cons': lambda x, lst: [x] + (lst if isinstance(lst, list) else [lst]),
+    'car': lambda lst: lst.head if type(lst) is Pair else lst[0] if lst else None,
+    'cdr': rest,
+    'cons': lambda x, lst: Pair(x, lst if type(lst) is Pair or type(lst) is list else Pair(lst, [])),
     'length': len,
-    'append': lambda *lsts: [item for lst in lsts for item in lst],
-}
+    'append': append_lists,
+})
+
+# The builtins whose result depends only on their arguments, as originally
+# bound: programs may rebind the names in base_environment itself
+PURE_BUILTINS = {name: base_environment[name] for name in [
+    '+', '-', '*', '/', '>', '>=', '<', '<=', '=', '!=',
+    'null?', 'list', 'car', 'cdr', 'cons', 'length', 'append']}
 
 def repl():
     """Read-Eval-Print Loop"""
-    env = dict(base_environment)
+    env = Environment(base_environment)
     print("Lisp Interpreter - Enter expressions (Ctrl+C to exit)")
     
     while True:
@@ -251,12 +1107,10 @@ def repl():
             user_input = input("lisp> ")
             if user_input.strip():
                 try:
-                    tokens = tokenize(user_input)
-                    if tokens:
-                        parsed = parse(tokens)
-                        result = eval_expr(parsed, env)
-                        if result is not None:
-                            print(result)
+                    parsed = parse(user_input)
+                    result = eval_expr(parsed, env)
+                    if result is not None:
+                        print(result)
                 except Exception as e:
                     print("Error:", e)
         except KeyboardInterrupt:
@@ -271,9 +1125,8 @@ def run_file(filename):
     try:
         with open(filename, 'r') as fd:
             contents = fd.read()
-            tokens = tokenize(contents)
-            if tokens:
-                parsed = parse(tokens)
+            if contents.strip():
+                parsed = parse(contents)
                 eval_expr(parsed, base_environment)
     except FileNotFoundError:
         print("File not found:", filename)
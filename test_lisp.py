@@ -0,0 +1,105 @@
+import types
+import unittest
+from unittest import mock
+
+import lisp
+
+try:
+    import numba
+    import numpy
+except ImportError:
+    numba = numpy = None
+
+# Just enough of numpy for jit_compile and call_native, over plain lists
+fake_numpy = types.SimpleNamespace(
+    intc='intc',
+    float64='float64',
+    frombuffer=lambda buffer, dtype: list(buffer),
+    array=lambda values, dtype: list(values),
+    empty=lambda size: [0.0] * size,
+)
+
+# njit as the identity, so run_numeric runs as plain Python
+fake_numba = types.SimpleNamespace(njit=lambda *signature, **options: (lambda fn: fn))
+
+NUMERIC_LAMBDAS = [
+    ("(lambda (a b) (+ a b))", [(1.5, 2.25), (-3.0, 0.5)]),
+    ("(lambda (a b) (- (* a b) (/ a 4)))", [(2.0, 3.0), (-1.5, 0.25)]),
+    ("(lambda (a b) (< a b))", [(1.0, 2.0), (2.0, 1.0), (1.0, 1.0)]),
+    ("(lambda (a b) (>= a b))", [(1.0, 2.0), (2.0, 1.0), (1.0, 1.0)]),
+    ("(lambda (a b) (= a b))", [(1.0, 1.0), (1.0, 2.0)]),
+    ("(lambda (a b) (!= a b))", [(1.0, 1.0), (1.0, 2.0)]),
+    ("(lambda (x) (if (> x 0.0) (* x 2) (- 0 x)))", [(3.0,), (-4.0,), (0.0,)]),
+    ("(lambda (x y) (if (<= x y) (if (= x y) 0.5 (+ x 1)) (/ y x)))",
+     [(1.0, 2.0), (2.0, 2.0), (4.0, 2.0)]),
+    ("(lambda (x) (if (< x 0.0) (< x 1.0) (> x 1.0)))", [(-1.0,), (0.5,), (2.0,)]),
+]
+
+class KernelTestCase(unittest.TestCase):
+    # The numba and numpy modules call_native should use
+    numba = None
+    numpy = None
+
+    def setUp(self):
+        patcher = mock.patch.object(lisp, 'numeric_kernel', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def define(self, source):
+        environment = lisp.Environment(lisp.base_environment)
+        return lisp.eval_expr(lisp.parse(source), environment)
+
+    def call(self, fn, args, jit=True):
+        with mock.patch.object(lisp, 'numba_module', self.numba if jit else False), \
+                mock.patch.object(lisp, 'numpy_module', self.numpy):
+            return lisp.apply_fn(fn, list(args), fn.environment)
+
+    def test_kernel_matches_interpreter(self):
+        for source, calls in NUMERIC_LAMBDAS:
+            for args in calls:
+                with self.subTest(source=source, args=args):
+                    fn = self.define(source)
+                    native = self.call(fn, args)
+                    self.assertIsNotNone(fn.body.native)
+                    self.assertIsNotNone(fn.body.numeric)
+                    expected = self.call(self.define(source), args, jit=False)
+                    self.assertEqual(type(native), type(expected))
+                    self.assertEqual(native, expected)
+
+    def test_division_by_zero_falls_back_for_that_call(self):
+        fn = self.define("(lambda (x) (/ 1.0 x))")
+        with self.assertRaises(ZeroDivisionError):
+            self.call(fn, (0.0,))
+        self.assertIsNotNone(fn.body.numeric)
+        self.assertEqual(self.call(fn, (4.0,)), 0.25)
+        self.assertIsNotNone(fn.body.native)
+
+    def test_int_arguments_use_interpreter(self):
+        fn = self.define("(lambda (a b) (+ a b))")
+        self.assertEqual(self.call(fn, (2, 3)), 5)
+        self.assertIsNone(fn.body.native)
+
+class StubKernelTest(KernelTestCase):
+    numba = fake_numba
+    numpy = fake_numpy
+
+@unittest.skipUnless(numba, "numba is not installed")
+class NumbaKernelTest(KernelTestCase):
+    numba = numba
+    numpy = numpy
+
+del KernelTestCase
+
+class ListTest(unittest.TestCase):
+    def evaluate(self, source):
+        return lisp.eval_expr(lisp.parse(source), lisp.Environment(lisp.base_environment))
+
+    def test_cdr(self):
+        self.assertEqual(self.evaluate("(cdr (list 1 2 3))"), [2, 3])
+        self.assertEqual(self.evaluate("(cdr (cons 1 (list 2)))"), [2])
+        self.assertEqual(self.evaluate("(cdr (list 1))"), [])
+        self.assertEqual(self.evaluate("(cdr 'abc')"), 'bc')
+        self.assertEqual(self.evaluate("(cdr 'a')"), [])
+
+if __name__ == '__main__':
+    unittest.main()